@@ -3,9 +3,20 @@ import os
 import json
 import re
 import asyncio
+import logging
 import discord
 from discord.ext import commands
 
+import subsystems
+from singleflight import SingleFlight, make_key
+from command_core import CommandRequest, help_embed
+from task_supervisor import get_supervisor
+from tara_logging import bind, unbind
+from tracing import trace, span
+from prompt_prep import PreparedPrompt, prepare_prompt
+
+log = logging.getLogger(__name__)
+
 # ===== ChatCommands Cog =====
 class ChatCommands(commands.Cog):
     """
@@ -15,11 +26,15 @@ class ChatCommands(commands.Cog):
     - Works with a provided shapes_client for LLM responses (optional).
     """
 
-    def __init__(self, bot, shapes_client=None, model_name: Optional[str] = None):
+    def __init__(self, bot, shapes_client=None, model_name: Optional[str] = None, image_service=None):
         self.bot = bot
         self.shapes_client = shapes_client
         self.model_name = model_name or os.getenv("SHAPE_MODEL_NAME") or "shape-medium"
-        print("[BOT] Chat_Commands Ready!", flush=True)
+        self.image_service = image_service
+        self.llm_flight = getattr(bot, "llm_flight", None) or SingleFlight()
+        self.supervisor = get_supervisor(bot)
+        self._image_job = None
+        log.info("[BOT] Chat_Commands Ready!")
 
     # ---------- Helpers ----------
     @staticmethod
@@ -51,36 +66,16 @@ class ChatCommands(commands.Cog):
         return self.bot.prefixes.get(str(guild.id), default_prefix)
 
     # ---------- Help ----------
+    async def _help(self, req: CommandRequest):
+        await req.send(embed=help_embed(self._get_prefix(req.guild)))
+
     @discord.app_commands.command(name="help", description="Show bot help.")
     async def slash_help(self, interaction: discord.Interaction):
-        prefix = self._get_prefix(interaction.guild)
-        embed = discord.Embed(title="Tara Bot Help", color=0xffc0cb)
-        embed.add_field(name=f"{prefix}s_help", value="Show this help message", inline=False)
-        embed.add_field(name=f"{prefix}s_talk <message>", value="Bot will join your VC and speak the message (one user at a time; auto-release after 10 minutes of inactivity).", inline=False)
-        embed.add_field(name=f"{prefix}s_talkstatus", value="Check who is using the talk command and time remaining.", inline=False)
-        embed.add_field(name=f"{prefix}s_setbotchannel", value="(Admin) Set this channel as the bot chat channel (bot replies to all messages here).", inline=False)
-        embed.add_field(name=f"{prefix}s_unsetbotchannel", value="(Admin) Unset fixed bot chat channel (bot replies only to mentions/replies).", inline=False)
-        embed.add_field(name=f"{prefix}setprefix <prefix>", value="(Admin) Change the bot's prefix for this server.", inline=False)
-        embed.add_field(name="Mention or reply to the bot", value="Bot will reply in any text channel.", inline=False)
-        embed.add_field(name=f"Image prompt (e.g. '{prefix}imagine a cute cat')", value="Bot will generate an image (if your backend supports it).", inline=False)
-        embed.set_footer(text="TARA Bot | Powered by Shape & ElevenLabs (TTS)")
-        await interaction.response.send_message(embed=embed, ephemeral=True)
+        await self._help(CommandRequest.from_interaction(interaction))
 
     @commands.command(name="s_help", aliases=["help"])
     async def help_command(self, ctx: commands.Context):
-        # reuse the slash embed
-        prefix = self._get_prefix(ctx.guild)
-        embed = discord.Embed(title="Tara Bot Help", color=0xffc0cb)
-        embed.add_field(name=f"{prefix}s_help", value="Show this help message", inline=False)
-        embed.add_field(name=f"{prefix}s_talk <message>", value="Bot will join your VC and speak the message (one user at a time; auto-release after 10 minutes of inactivity).", inline=False)
-        embed.add_field(name=f"{prefix}s_talkstatus", value="Check who is using the talk command and time remaining.", inline=False)
-        embed.add_field(name=f"{prefix}s_setbotchannel", value="(Admin) Set this channel as the bot chat channel (bot replies to all messages here).", inline=False)
-        embed.add_field(name=f"{prefix}s_unsetbotchannel", value="(Admin) Unset fixed bot chat channel (bot replies only to mentions/replies).", inline=False)
-        embed.add_field(name=f"{prefix}setprefix <prefix>", value="(Admin) Change the bot's prefix for this server.", inline=False)
-        embed.add_field(name="Mention or reply to the bot", value="Bot will reply in any text channel.", inline=False)
-        embed.add_field(name=f"Image prompt (e.g. '{prefix}imagine a cute cat')", value="Bot will generate an image (if your backend supports it).", inline=False)
-        embed.set_footer(text="TARA Bot | Powered by Shape & ElevenLabs (TTS)")
-        await ctx.send(embed=embed)
+        await self._help(CommandRequest.from_context(ctx))
 
     # ---------- Prefix management ----------
     @discord.app_commands.command(name="setprefix", description="(Admin) Change the bot's prefix for this server.")
@@ -149,51 +144,87 @@ class ChatCommands(commands.Cog):
             return False
 
         if not should_trigger():
+            log.debug("[CHAT] ignoring message %s", message.id, extra={"sample_every": 100})
             return
 
+        # Tag every record logged while handling this message
+        token = bind(guild_id=message.guild.id, user_id=message.author.id, request_id=message.id)
+        try:
+            with trace("on_message"):
+                await self._handle_message(message)
+        finally:
+            unbind(token)
+
+    async def _handle_message(self, message: discord.Message):
+        bot: commands.Bot = self.bot
+
         # Prevent feedback loops with prefix commands; let command processor run
-        ctx = await bot.get_context(message)
+        with span("get_context"):
+            ctx = await bot.get_context(message)
         if ctx.valid:
             return
 
+        # Resolve mentions, collapse spam and cap length before anything goes upstream.
+        # Intent detection still sees the original content.
+        with span("prompt_prep") as s:
+            prepared = prepare_prompt(message.content, message.guild, message.mentions, bot.user)
+            if s is not None:
+                s.attrs.update(prepared.span_attrs())
+
         async with message.channel.typing():
             await asyncio.sleep(0.5)
-            response = await self.chat_with_bot(message.content)
+            with span("chat_with_bot"):
+                response = await self.chat_with_bot(message.content, prepared)
 
         # Route to Talk if voice intent
         if isinstance(response, dict) and response.get("type") == "voice":
             talk_cog = bot.get_cog("TalkCommands")
             if talk_cog:
                 ctx = await bot.get_context(message)
-                # call the prefix command implementation directly
-                await talk_cog.talk_command(ctx, message=message.content)
+                with span("talk"):
+                    await talk_cog.talk(CommandRequest.from_context(ctx), None, message.content, prepared)
             else:
                 await message.channel.send("Voice module is not loaded. Ask the admin to load `talk_commands`.")
             return
 
-        # Image intent -> send URL or text fallback
+        # Image intent -> send URL, queue a generation job, or text fallback
         if isinstance(response, dict) and response.get("type") == "image":
             url = response.get("url")
             if url:
                 await message.channel.send(url)
+            elif response.get("prompt") and self.image_service:
+                working = await message.channel.send("🎨 Working on your image…")
+                job = self.image_service.submit(response["prompt"])
+                # Don't await here: slow image jobs must not hold up this listener
+                self.supervisor.spawn(self._deliver_image(working, job), name="chat.deliver_image")
             else:
                 await message.channel.send(response.get("text") or "I tried to create an image but couldn't.")
             return
 
         # Plain text
-        if isinstance(response, str):
-            await message.channel.send(response)
-        elif isinstance(response, dict) and "text" in response:
-            await message.channel.send(response["text"])
-        else:
-            await message.channel.send("Sorry, I couldn't understand that.")
+        with span("reply"):
+            if isinstance(response, str):
+                await message.channel.send(response)
+            elif isinstance(response, dict) and "text" in response:
+                await message.channel.send(response["text"])
+            else:
+                await message.channel.send("Sorry, I couldn't understand that.")
+
+    async def _deliver_image(self, working: discord.Message, job: asyncio.Future) -> None:
+        try:
+            url = await job
+        except Exception:
+            await working.edit(content="I tried to create an image but couldn't.")
+            return
+        await working.edit(content=url)
 
     # ---------- LLM call + simple intent detection ----------
-    async def chat_with_bot(self, message: str):
+    async def chat_with_bot(self, message: str, prepared: Optional[PreparedPrompt] = None):
         """
+        Intents are matched on `message` as typed; the LLM gets `prepared.text` when given.
         Returns:
           - {'type':'voice'} to route to VC talk
-          - {'type':'image','url':...} or {'type':'image','text':...}
+          - {'type':'image','url':...}, {'type':'image','prompt':...} or {'type':'image','text':...}
           - plain text string
         """
         # voice keywords
@@ -204,14 +235,23 @@ class ChatCommands(commands.Cog):
         img_match = re.search(r"^(?:!imagine\s+)?(?:imagine|draw|paint|sketch|generate|make)\s+(.*)", message, re.I)
         if img_match:
             prompt = img_match.group(1).strip()
-            # If you have an image backend, call it here and return URL.
+            if self.image_service and prompt:
+                url = self.image_service.cached(prompt)
+                if url:
+                    return {"type": "image", "url": url}
+                return {"type": "image", "prompt": prompt}
             return {"type": "image", "text": f"(Image request noted) Prompt: {prompt}"}
 
         # Call Shapes client if provided
         if self.shapes_client:
+            # A bare mention prepares to nothing; send what the user actually typed
+            prompt = prepared.text if prepared and prepared.text else message
             try:
                 # Example Shape SDK call; adjust to your client API
-                reply = self.shapes_client.chat(self.model_name, message)
+                with span("llm", model=self.model_name):
+                    reply = await self.llm_flight.do(
+                        make_key(self.model_name, prompt), self.shapes_client.chat, self.model_name, prompt
+                    )
                 if isinstance(reply, str):
                     return reply
                 if isinstance(reply, dict) and "text" in reply:
@@ -229,7 +269,17 @@ class ChatCommands(commands.Cog):
             await self.bot.tree.sync()
         except Exception:
             pass
-        print("[BOT] ChatCommands ready & slash commands synced.", flush=True)
+        log.info("[BOT] ChatCommands ready & slash commands synced.")
+
+    async def cog_load(self):
+        if self.image_service:
+            self._image_job = self.supervisor.every(300, self.image_service.evict_expired, name="images.evict_expired")
+
+    async def cog_unload(self):
+        if self._image_job:
+            self.supervisor.cancel(self._image_job)
+        if self.image_service:
+            await self.image_service.close()
 
 
 async def setup(bot: commands.Bot):
@@ -240,4 +290,6 @@ async def setup(bot: commands.Bot):
     # If you build the bot elsewhere, pass shapes_client & model_name via bot attrs:
     shapes_client = getattr(bot, "shapes_client", None)
     model_name = getattr(bot, "shape_model_name", None)
-    await bot.add_cog(ChatCommands(bot, shapes_client, model_name))
+    image_generation = subsystems.load("images")
+    image_service = image_generation.create_service() if image_generation else None
+    await bot.add_cog(ChatCommands(bot, shapes_client, model_name, image_service))
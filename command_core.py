@@ -0,0 +1,84 @@
+"""
+Shared command-handling core for prefix and slash entry points.
+
+Business logic takes a CommandRequest instead of a commands.Context or an
+Interaction, so both entry points call the same code without building
+per-invocation shim classes.
+"""
+from typing import Optional
+from functools import lru_cache
+
+import discord
+from discord.ext import commands
+
+
+class CommandRequest:
+    """
+    Lightweight view over one command invocation.
+    - send() replies through ctx.send for prefix commands; for slash commands it uses the
+      initial response if still open, otherwise the followup webhook.
+    - defer() acknowledges a slash command up front so slow work streams in via followups.
+    """
+
+    __slots__ = ("bot", "guild", "author", "channel", "request_id", "ephemeral", "_ctx", "_interaction")
+
+    def __init__(self, bot, guild, author, channel, request_id: int, ctx=None, interaction=None, ephemeral: bool = False):
+        self.bot = bot
+        self.guild = guild
+        self.author = author
+        self.channel = channel
+        self.request_id = request_id
+        self.ephemeral = ephemeral
+        self._ctx = ctx
+        self._interaction = interaction
+
+    @classmethod
+    def from_context(cls, ctx: commands.Context) -> "CommandRequest":
+        return cls(ctx.bot, ctx.guild, ctx.author, ctx.channel, ctx.message.id, ctx=ctx)
+
+    @classmethod
+    def from_interaction(cls, interaction: discord.Interaction, ephemeral: bool = True) -> "CommandRequest":
+        return cls(interaction.client, interaction.guild, interaction.user, interaction.channel, interaction.id,
+                   interaction=interaction, ephemeral=ephemeral)
+
+    def log_fields(self) -> dict:
+        return {
+            "guild_id": self.guild.id if self.guild else None,
+            "user_id": self.author.id,
+            "request_id": self.request_id,
+        }
+
+    @property
+    def voice_client(self) -> Optional[discord.VoiceClient]:
+        # Read live: the bot may connect/move while the command runs
+        return self.guild.voice_client if self.guild else None
+
+    async def defer(self, thinking: bool = True) -> None:
+        if self._interaction is not None and not self._interaction.response.is_done():
+            await self._interaction.response.defer(ephemeral=self.ephemeral, thinking=thinking)
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> Optional[discord.Message]:
+        """Returns the sent message, or None for an initial (non-deferred) slash response."""
+        if self._interaction is None:
+            return await self._ctx.send(content, **kwargs)
+        if not self._interaction.response.is_done():
+            await self._interaction.response.send_message(content, ephemeral=self.ephemeral, **kwargs)
+            return None
+        return await self._interaction.followup.send(content, ephemeral=self.ephemeral, **kwargs)
+
+
+# ===== Static embeds =====
+@lru_cache(maxsize=64)
+def help_embed(prefix: str) -> discord.Embed:
+    """Built once per prefix; callers must not mutate the returned embed."""
+    embed = discord.Embed(title="Tara Bot Help", color=0xffc0cb)
+    embed.add_field(name=f"{prefix}s_help", value="Show this help message", inline=False)
+    embed.add_field(name=f"{prefix}s_talk <message>", value="Bot will join your VC and speak the message (one user at a time; auto-release after 10 minutes of inactivity).", inline=False)
+    embed.add_field(name=f"{prefix}s_talkstatus", value="Check who is using the talk command and time remaining.", inline=False)
+    embed.add_field(name=f"{prefix}s_setbotchannel", value="(Admin) Set this channel as the bot chat channel (bot replies to all messages here).", inline=False)
+    embed.add_field(name=f"{prefix}s_unsetbotchannel", value="(Admin) Unset fixed bot chat channel (bot replies only to mentions/replies).", inline=False)
+    embed.add_field(name=f"{prefix}setprefix <prefix>", value="(Admin) Change the bot's prefix for this server.", inline=False)
+    embed.add_field(name="Mention or reply to the bot", value="Bot will reply in any text channel.", inline=False)
+    embed.add_field(name=f"Image prompt (e.g. '{prefix}imagine a cute cat')", value="Bot will generate an image (if your backend supports it).", inline=False)
+    embed.set_footer(text="TARA Bot | Powered by Shape & ElevenLabs (TTS)")
+    return embed
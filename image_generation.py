@@ -0,0 +1,175 @@
+"""
+Image generation subsystem.
+
+Prompts are submitted to an ImageService which runs them on a bounded pool of
+async workers, caches finished URLs by normalized prompt and hands identical
+in-flight prompts the same future. Backends are pluggable; pick one with
+TARA_IMAGE_BACKEND (stub | openai).
+"""
+from typing import Optional
+import os
+import time
+import asyncio
+import logging
+import contextvars
+from collections import OrderedDict
+from urllib.parse import quote
+
+from prompt_prep import normalize
+
+log = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Cache/dedup key: the shared normalized form without trailing punctuation."""
+    return normalize(prompt).strip(".!?,;:").strip()
+
+
+# ===== Backends =====
+class StubImageBackend:
+    """Local backend for testing: no network, returns a placeholder image URL after `delay` seconds."""
+
+    name = "stub"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    async def generate(self, prompt: str) -> str:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return f"https://placehold.co/512x512/png?text={quote(prompt[:80])}"
+
+
+class OpenAIImageBackend:
+    """OpenAI-compatible `images.generate` endpoint. The SDK call is blocking, so it runs in a thread."""
+
+    name = "openai"
+
+    def __init__(self, client, model: str = "dall-e-3", size: str = "1024x1024"):
+        self.client = client
+        self.model = model
+        self.size = size
+
+    async def generate(self, prompt: str) -> str:
+        resp = await asyncio.to_thread(
+            self.client.images.generate, model=self.model, prompt=prompt, size=self.size, n=1
+        )
+        url = resp.data[0].url if resp.data else None
+        if not url:
+            raise RuntimeError("Image backend returned no URL.")
+        return url
+
+
+def create_backend():
+    name = os.getenv("TARA_IMAGE_BACKEND", "stub").lower()
+    if name == "openai":
+        from openai import OpenAI
+        client = OpenAI(api_key=os.getenv("IMAGE_API_KEY") or os.getenv("API_KEY"), base_url=os.getenv("IMAGE_BASE_URL") or None)
+        return OpenAIImageBackend(client, model=os.getenv("IMAGE_MODEL", "dall-e-3"))
+    return StubImageBackend(delay=float(os.getenv("TARA_IMAGE_STUB_DELAY", "0")))
+
+
+# ===== Service =====
+class ImageService:
+    """
+    - submit() never blocks on generation: it returns a future the caller can await later.
+    - At most `concurrency` jobs hit the backend at once; the rest wait in the queue.
+    - Finished URLs are cached (LRU, `cache_size` entries, `ttl` seconds); failures are not cached.
+    """
+
+    def __init__(self, backend, concurrency: int = 2, cache_size: int = 256, timeout: float = 120.0, ttl: float = 6 * 3600):
+        self.backend = backend
+        self.concurrency = concurrency
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.ttl = ttl
+        self._cache: OrderedDict = OrderedDict()
+        self._inflight: dict = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: list = []
+
+    def cached(self, prompt: str) -> Optional[str]:
+        key = normalize_prompt(prompt)
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        url, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return url
+
+    def evict_expired(self) -> int:
+        """Drop expired cache entries; returns how many were removed."""
+        now = time.monotonic()
+        expired = [key for key, (_, expires_at) in self._cache.items() if expires_at < now]
+        for key in expired:
+            del self._cache[key]
+        return len(expired)
+
+    def submit(self, prompt: str) -> asyncio.Future:
+        """Queue a prompt (or join an identical in-flight one) and return a future resolving to the image URL."""
+        key = normalize_prompt(prompt)
+        loop = asyncio.get_running_loop()
+        url = self.cached(prompt)
+        if url is not None:
+            fut = loop.create_future()
+            fut.set_result(url)
+            return fut
+        fut = self._inflight.get(key)
+        if fut is not None:
+            return asyncio.shield(fut)
+        self._ensure_workers()
+        fut = loop.create_future()
+        self._inflight[key] = fut
+        self._queue.put_nowait((key, prompt, fut))
+        # Waiters get a shield so one cancelled caller doesn't cancel the shared job
+        return asyncio.shield(fut)
+
+    def _ensure_workers(self) -> None:
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if not self._workers:
+            # Fresh context: workers outlive the request that happened to start them
+            self._workers = [
+                asyncio.create_task(self._worker(), context=contextvars.Context()) for _ in range(self.concurrency)
+            ]
+
+    async def _worker(self) -> None:
+        while True:
+            key, prompt, fut = await self._queue.get()
+            try:
+                # asyncio.timeout, not wait_for: on 3.11 wait_for can swallow close()'s cancel
+                async with asyncio.timeout(self.timeout):
+                    url = await self.backend.generate(prompt)
+            except Exception as e:
+                log.warning("[IMAGE] %s failed for %r: %s", self.backend.name, prompt, e)
+                if not fut.done():
+                    fut.set_exception(e)
+                    fut.exception()  # mark retrieved; waiters may all have gone away
+            else:
+                self._cache[key] = (url, time.monotonic() + self.ttl)
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+                if not fut.done():
+                    fut.set_result(url)
+            finally:
+                self._inflight.pop(key, None)
+                self._queue.task_done()
+
+    async def close(self) -> None:
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+
+def create_service() -> ImageService:
+    return ImageService(
+        create_backend(),
+        concurrency=int(os.getenv("TARA_IMAGE_CONCURRENCY", "2")),
+        cache_size=int(os.getenv("TARA_IMAGE_CACHE_SIZE", "256")),
+        ttl=float(os.getenv("TARA_IMAGE_CACHE_TTL", str(6 * 3600))),
+    )
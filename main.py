@@ -7,14 +7,20 @@ import asyncio
 import logging
 from datetime import datetime
 
-import discord
-from discord.ext import commands
-from dotenv import load_dotenv
-from openai import OpenAI
+import subsystems
+from tara_logging import setup_logging, stop_logging
+from singleflight import SingleFlight
+from task_supervisor import TaskSupervisor
+from outbound import OutboundQueue
+import prompt_prep
 
 # --- Env & logging ---
-load_dotenv()
-logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:  # containers usually inject env directly
+    pass
+setup_logging()
 
 API_KEY = os.getenv("API_KEY")
 MODEL_NAME = os.getenv("MODEL_NAME", "shape-medium")
@@ -25,9 +31,6 @@ FFMPEG_PATH = os.path.join(os.path.dirname(__file__), "ffmpeg.exe")
 if os.path.isfile(FFMPEG_PATH):
     os.environ["PATH"] = os.path.dirname(FFMPEG_PATH) + os.pathsep + os.environ.get("PATH", "")
 
-# --- Shape.inc client (OpenAI-compatible base_url) ---
-_raw_shapes = OpenAI(api_key=API_KEY, base_url="https://api.shapes.inc/v1/")
-
 class ShapesAdapter:
     """Adapts the OpenAI-style client to a simple .chat(model, message) interface expected by the cog."""
     def __init__(self, client):
@@ -48,13 +51,10 @@ class ShapesAdapter:
         except Exception as e:
             return f"Shape error: {e!r}"
 
-shapes_client = ShapesAdapter(_raw_shapes)
-
-# --- Discord intents ---
-intents = discord.Intents.default()
-intents.message_content = True
-intents.voice_states = True  # needed for VC join/move/play
-intents.guilds = True
+# --- Shape.inc client (OpenAI-compatible base_url) ---
+def create_shapes_client() -> ShapesAdapter:
+    OpenAI = subsystems.timed_import("openai").OpenAI
+    return ShapesAdapter(OpenAI(api_key=API_KEY, base_url="https://api.shapes.inc/v1/"))
 
 # --- Dynamic prefix (reads config.json if present) ---
 def get_prefix(bot, message):
@@ -68,46 +68,80 @@ def get_prefix(bot, message):
         return bot.prefixes.get(str(message.guild.id), "!s_")
     return "!s_"
 
-bot = commands.Bot(command_prefix=get_prefix, intents=intents)
-bot.remove_command("help")
-
-# Make Shape available to cogs
-bot.shapes_client = shapes_client
-bot.shape_model_name = MODEL_NAME
-
-@bot.event
-async def on_ready():
-    logging.info("[BOT] Logged in as %s (%s)", bot.user, bot.user.id)
-    # Set bot status to Streaming with description and link (attachment link)
-    activity = discord.Streaming(
-        name="Talking to People in Souls",
-        url="https://www.twitch.tv/souls_server"
-    )
-    await bot.change_presence(activity=activity, status=discord.Status.online)
-    try:
-        synced = await bot.tree.sync()
-        logging.info("[INFO] Synced %d slash commands.", len(synced))
-    except Exception as e:
-        logging.error("[ERROR] Failed to sync slash commands: %s", e)
+def create_bot(shapes_client: ShapesAdapter):
+    discord = subsystems.timed_import("discord")
+    commands = subsystems.timed_import("discord.ext.commands")
+
+    # --- Discord intents ---
+    intents = discord.Intents.default()
+    intents.message_content = True
+    intents.voice_states = True  # needed for VC join/move/play
+    intents.guilds = True
+
+    bot = commands.Bot(command_prefix=get_prefix, intents=intents)
+    bot.remove_command("help")
+
+    # Make Shape available to cogs
+    bot.shapes_client = shapes_client
+    bot.shape_model_name = MODEL_NAME
+    # Shared by every cog so identical in-flight prompts hit Shape once
+    bot.llm_flight = SingleFlight()
+    # Owns every background task; shut down gracefully when the bot stops
+    bot.supervisor = TaskSupervisor()
+    # Bucketed, merging queue for fire-and-forget REST calls (mute toggles, status deletes)
+    bot.outbound = OutboundQueue()
+
+    @bot.event
+    async def on_ready():
+        logging.info("[BOT] Logged in as %s (%s)", bot.user, bot.user.id)
+        # Set bot status to Streaming with description and link (attachment link)
+        activity = discord.Streaming(
+            name="Talking to People in Souls",
+            url="https://www.twitch.tv/souls_server"
+        )
+        await bot.change_presence(activity=activity, status=discord.Status.online)
+        try:
+            synced = await bot.tree.sync()
+            logging.info("[INFO] Synced %d slash commands.", len(synced))
+        except Exception as e:
+            logging.error("[ERROR] Failed to sync slash commands: %s", e)
+
+    if not subsystems.is_enabled("voice"):
+        @bot.command(name="s_talk", aliases=["talk"])
+        async def talk_command(ctx, *args, **kwargs):
+            await ctx.send("😂 Sorry bhai, abhi baat nahi ho sakti! Dev bhai feature fix kar rahe hain, thoda intezaar karo, mast baat hogi fir. 🚧")
 
-async def load_cogs():
-    import chat_commands
+    return bot
+
+async def load_cogs(bot):
+    chat_commands = subsystems.timed_import("chat_commands")
     try:
         await chat_commands.setup(bot)
         logging.info("[BOT] Loaded chat_commands")
     except Exception as e:
         logging.exception("[ERROR] Failed to load chat_commands: %s", e)
+
+    talk_commands = subsystems.load("voice")
+    if talk_commands:
+        try:
+            await talk_commands.setup(bot)
+            logging.info("[BOT] Loaded talk_commands")
+        except Exception as e:
+            logging.exception("[ERROR] Failed to load talk_commands: %s", e)
+
 def run_flask():
     try:
-        from tara_flask_server import app as flask_app
+        tara_flask_server = subsystems.load("dashboard")
+        if tara_flask_server is None:
+            return
         port = int(os.getenv("PORT", "5000"))   # <-- Render will inject PORT
-        flask_app.run(host="0.0.0.0", port=port, debug=False)
+        tara_flask_server.app.run(host="0.0.0.0", port=port, debug=False)
     except Exception as e:
         logging.warning("Flask server not started: %s", e)
 
-def test_shapes_connectivity():
+def test_shapes_connectivity(shapes_client: ShapesAdapter):
     try:
-        resp = _raw_shapes.chat.completions.create(
+        resp = shapes_client.client.chat.completions.create(
             model=MODEL_NAME,
             messages=[{"role": "user", "content": "ping"}],
         )
@@ -115,22 +149,35 @@ def test_shapes_connectivity():
     except Exception as e:
         logging.error("[BOT] ERROR: Could not connect to SHAPE.INC with model '%s': %s", MODEL_NAME, e)
 
+def log_runtime_stats(bot):
+    logging.info("[STATS] tasks=%s llm=%s prompt_tokens_saved=%s",
+                 bot.supervisor.stats(), bot.llm_flight.stats(), dict(prompt_prep.TOTALS))
+
 async def main():
     if not DISCORD_TOKEN:
         raise RuntimeError("Set DISCORD_TOKEN in environment.")
     # Start Flask (optional)
-    flask_thread = threading.Thread(target=run_flask, daemon=True)
-    flask_thread.start()
-    logging.info("🌐 Tara Web Dashboard thread started at http://localhost:5000")
-
-    test_shapes_connectivity()
-
-    await load_cogs()
-    await bot.start(DISCORD_TOKEN)
-
-@bot.command(name="s_talk", aliases=["talk"])
-async def talk_command(ctx, *args, **kwargs):
-    await ctx.send("😂 Sorry bhai, abhi baat nahi ho sakti! Dev bhai feature fix kar rahe hain, thoda intezaar karo, mast baat hogi fir. 🚧")
+    if subsystems.is_enabled("dashboard"):
+        flask_thread = threading.Thread(target=run_flask, daemon=True)
+        flask_thread.start()
+        logging.info("🌐 Tara Web Dashboard thread started at http://localhost:5000")
+
+    shapes_client = create_shapes_client()
+    test_shapes_connectivity(shapes_client)
+
+    bot = create_bot(shapes_client)
+    await load_cogs(bot)
+    subsystems.log_startup_report()
+    bot.supervisor.every(int(os.getenv("TARA_STATS_INTERVAL", "300")), lambda: log_runtime_stats(bot), name="stats.log")
+    try:
+        await bot.start(DISCORD_TOKEN)
+    finally:
+        logging.info("[BOT] Shutting down %d background task(s)", bot.supervisor.live_tasks)
+        await bot.supervisor.shutdown()
+        await bot.outbound.close()
+        if not bot.is_closed():
+            await bot.close()
+        stop_logging()
 
 if __name__ == "__main__":
     if sys.platform == "win32":
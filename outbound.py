@@ -0,0 +1,169 @@
+"""
+Rate-limit-aware outbound queue for Discord REST calls.
+
+Actions are grouped by route bucket (e.g. one channel's messages, one guild's
+member edits). Actions in the same bucket run in order and are spaced to stay
+under that bucket's limit; different buckets run concurrently. A pending action
+can be merged with a newer one for the same target (e.g. mute/unmute toggles),
+and edits that wouldn't change anything are skipped.
+"""
+from typing import Optional
+import time
+import asyncio
+import logging
+import contextvars
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+
+# bucket kind -> (requests, per seconds); conservative versions of Discord's defaults
+BUCKET_LIMITS = {
+    "channel": (5, 5.0),
+    "member": (10, 10.0),
+}
+
+
+class _Action:
+    __slots__ = ("fn", "args", "kwargs", "merge_key", "future")
+
+    def __init__(self, fn, args, kwargs, merge_key, future):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.merge_key = merge_key
+        self.future = future
+
+
+class _Bucket:
+    __slots__ = ("pending", "sent", "limit", "per", "worker")
+
+    def __init__(self, limit: int, per: float):
+        self.pending: deque = deque()
+        self.sent: deque = deque()
+        self.limit = limit
+        self.per = per
+        self.worker: Optional[asyncio.Task] = None
+
+    def delay(self) -> float:
+        now = time.monotonic()
+        while self.sent and now - self.sent[0] >= self.per:
+            self.sent.popleft()
+        if len(self.sent) < self.limit:
+            return 0.0
+        return self.per - (now - self.sent[0])
+
+
+class OutboundQueue:
+    """
+    - submit() returns a future for the action's result; awaiting it is optional.
+    - Actions submitted with the same merge_key while one is still pending replace it;
+      every caller gets the result of the action that finally ran.
+    """
+
+    def __init__(self):
+        self._buckets: dict = {}
+        self._mute_state: dict = {}
+        self.merged = 0
+        self.skipped = 0
+
+    def _bucket(self, key: tuple) -> _Bucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            limit, per = BUCKET_LIMITS.get(key[0], (5, 5.0))
+            bucket = self._buckets[key] = _Bucket(limit, per)
+        return bucket
+
+    def submit(self, bucket_key: tuple, fn, *args, merge_key=None, **kwargs) -> asyncio.Future:
+        bucket = self._bucket(bucket_key)
+        if merge_key is not None:
+            for action in bucket.pending:
+                if action.merge_key == merge_key:
+                    action.fn, action.args, action.kwargs = fn, args, kwargs
+                    self.merged += 1
+                    return action.future
+        future = asyncio.get_running_loop().create_future()
+        bucket.pending.append(_Action(fn, args, kwargs, merge_key, future))
+        if bucket.worker is None or bucket.worker.done():
+            # Fresh context: the worker drains actions from many requests, not just the one that started it
+            bucket.worker = asyncio.create_task(
+                self._drain(bucket), name=f"outbound.{bucket_key[0]}", context=contextvars.Context()
+            )
+        return future
+
+    async def _drain(self, bucket: _Bucket) -> None:
+        while bucket.pending:
+            wait = bucket.delay()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            action = bucket.pending.popleft()
+            bucket.sent.append(time.monotonic())
+            try:
+                result = await action.fn(*action.args, **action.kwargs)
+            except Exception as e:
+                log.warning("[OUTBOUND] %s failed: %s", getattr(action.fn, "__qualname__", action.fn), e)
+                if not action.future.done():
+                    action.future.set_exception(e)
+                    action.future.exception()  # fire-and-forget callers never retrieve it
+            else:
+                if not action.future.done():
+                    action.future.set_result(result)
+
+    # ---------- Common actions ----------
+    def send(self, channel, content: Optional[str] = None, **kwargs) -> asyncio.Future:
+        return self.submit(("channel", channel.id), channel.send, content, **kwargs)
+
+    def delete(self, message) -> asyncio.Future:
+        return self.submit(("channel", message.channel.id), message.delete)
+
+    def set_mute(self, member, mute: bool) -> asyncio.Future:
+        """Server-mute/unmute a member; queued toggles collapse into the last requested state."""
+        bucket_key = ("member", member.guild.id)
+        merge_key = ("mute", member.id)
+        bucket = self._bucket(bucket_key)
+        pending = next((action for action in bucket.pending if action.merge_key == merge_key), None)
+        # State the last started edit leaves behind; the cached voice state may lag an in-flight edit
+        voice = getattr(member, "voice", None)
+        current = self._mute_state.get((member.guild.id, member.id), voice.mute if voice is not None else None)
+        if current == mute:
+            if pending is not None:
+                # e.g. unmute -> (mute queued) -> unmute: the queued toggle cancels out
+                bucket.pending.remove(pending)
+                pending.future.set_result(None)
+                self.merged += 1
+                return pending.future
+            self.skipped += 1
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(None)
+            return future
+        return self.submit(bucket_key, self._apply_mute, member, mute, merge_key=merge_key)
+
+    async def _apply_mute(self, member, mute: bool) -> None:
+        key = (member.guild.id, member.id)
+        self._mute_state[key] = mute
+        try:
+            await member.edit(mute=mute)
+        except Exception:
+            self._mute_state.pop(key, None)
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "pending": sum(len(b.pending) for b in self._buckets.values()),
+            "merged": self.merged,
+            "skipped": self.skipped,
+        }
+
+    async def close(self) -> None:
+        workers = [b.worker for b in self._buckets.values() if b.worker and not b.worker.done()]
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+
+def get_outbound(bot) -> OutboundQueue:
+    """The bot-wide outbound queue, created on first use if main didn't attach one."""
+    outbound = getattr(bot, "outbound", None)
+    if outbound is None:
+        outbound = bot.outbound = OutboundQueue()
+    return outbound
@@ -0,0 +1,161 @@
+"""
+Prompt pre-processing before upstream LLM calls.
+
+prepare_prompt() resolves Discord mention markup to names (from the client
+cache), collapses repeated characters/words/lines, and enforces a token budget
+(TARA_PROMPT_TOKEN_BUDGET, default 1024) by keeping the head and tail of long
+pastes. Each step reports how many (estimated) tokens it saved. normalize() is
+the stable form cache and single-flight keys are built from.
+"""
+import os
+import re
+import logging
+
+log = logging.getLogger(__name__)
+
+TOKEN_BUDGET = int(os.getenv("TARA_PROMPT_TOKEN_BUDGET", "1024"))
+
+_USER_RE = re.compile(r"<@!?(\d+)>")
+_ROLE_RE = re.compile(r"<@&(\d+)>")
+_CHANNEL_RE = re.compile(r"<#(\d+)>")
+_EMOJI_RE = re.compile(r"<a?:(\w+):\d+>")
+# Only symbol/emoji runs ("!!!!!!", "😂😂😂😂"); letters and digits are never touched
+_CHAR_RUN_RE = re.compile(r"([^\w\s])\1{3,}")
+# Same letters-only word repeated on one line ("lol lol lol lol"); numbers are never touched
+_WORD_RUN_RE = re.compile(r"(?<!\S)([^\W\d]+)(?:[ \t]+\1(?!\S)){2,}")
+# Inline code and URLs are passed through verbatim
+_PROTECTED_RE = re.compile(r"(`[^`\n]*`|https?://\S+|www\.\S+)")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+# Lines that are only brackets/separators (code closers) are never deduplicated
+_CLOSER_RE = re.compile(r"^[\[\](){};,]*$")
+_WS_RE = re.compile(r"\s+")
+
+# Running totals of tokens saved per step since startup
+TOTALS: dict = {}
+
+
+def estimate_tokens(text: str) -> int:
+    """~4 chars per token; close enough for budgeting without a tokenizer dependency."""
+    return (len(text) + 3) // 4
+
+
+def normalize(text: str) -> str:
+    """Stable form for cache/dedup keys: lowercase with whitespace collapsed."""
+    return _WS_RE.sub(" ", text).strip().lower()
+
+
+class PreparedPrompt:
+    __slots__ = ("text", "savings")
+
+    def __init__(self, text: str, savings: dict):
+        self.text = text
+        self.savings = savings
+
+    @property
+    def tokens_saved(self) -> int:
+        return sum(self.savings.values())
+
+    def span_attrs(self) -> dict:
+        return {f"saved.{k}": v for k, v in self.savings.items()}
+
+
+# ===== Steps =====
+def resolve_mentions(text: str, guild=None, mentions=(), bot_user=None) -> str:
+    """<@id> -> @name (the bot's own mention is dropped), <@&id> -> @role, <#id> -> #channel, <:e:id> -> :e:."""
+    names = {m.id: m.display_name for m in mentions}
+
+    def user(match):
+        uid = int(match.group(1))
+        if bot_user is not None and uid == bot_user.id:
+            return ""
+        name = names.get(uid)
+        if name is None and guild is not None:
+            member = guild.get_member(uid)
+            name = member.display_name if member else None
+        return f"@{name}" if name else "@someone"
+
+    def role(match):
+        r = guild.get_role(int(match.group(1))) if guild is not None else None
+        return f"@{r.name}" if r else "@role"
+
+    def channel(match):
+        c = guild.get_channel(int(match.group(1))) if guild is not None else None
+        return f"#{c.name}" if c else "#channel"
+
+    text = _USER_RE.sub(user, text)
+    text = _ROLE_RE.sub(role, text)
+    text = _CHANNEL_RE.sub(channel, text)
+    return _EMOJI_RE.sub(r":\1:", text)
+
+
+def _collapse_inline(line: str) -> str:
+    parts = _PROTECTED_RE.split(line)
+    for idx in range(0, len(parts), 2):  # odd indexes are the protected matches
+        part = _CHAR_RUN_RE.sub(r"\1\1\1", parts[idx])
+        parts[idx] = _WORD_RUN_RE.sub(r"\1 \1", part)
+    return "".join(parts)
+
+
+def collapse_repetition(text: str) -> str:
+    """
+    '!!!!!!' -> '!!!', 'lol lol lol lol' -> 'lol lol', and an exact non-blank line repeated
+    back to back is kept once. Fenced code blocks, inline code and URLs are left as-is, and
+    indentation is preserved.
+    """
+    lines = []
+    in_fence = False
+    prev = None
+    for line in text.splitlines():
+        if _FENCE_RE.match(line):
+            in_fence = not in_fence
+            lines.append(line)
+            prev = None
+            continue
+        if in_fence:
+            lines.append(line)
+            continue
+        line = _collapse_inline(line.rstrip())
+        stripped = line.strip()
+        if stripped and line == prev and not line[:1].isspace() and not _CLOSER_RE.match(stripped):
+            continue
+        lines.append(line)
+        prev = line
+    return "\n".join(lines).strip("\n")
+
+
+def truncate_to_budget(text: str, budget: int = TOKEN_BUDGET) -> str:
+    """Keep roughly the first 2/3 and last 1/3 of the budget, cutting on whitespace."""
+    if estimate_tokens(text) <= budget:
+        return text
+    max_chars = budget * 4
+    head_chars = max_chars * 2 // 3
+    tail_chars = max_chars - head_chars
+    head = text[:head_chars]
+    cut = head.rfind(" ", head_chars // 2)
+    if cut > 0:
+        head = head[:cut]
+    tail = text[-tail_chars:]
+    cut = tail.find(" ", 0, tail_chars // 2)
+    if cut >= 0:
+        tail = tail[cut + 1:]
+    return f"{head.rstrip()}\n…\n{tail.lstrip()}"
+
+
+# ===== Pipeline =====
+def prepare_prompt(text: str, guild=None, mentions=(), bot_user=None, budget: int = TOKEN_BUDGET) -> PreparedPrompt:
+    steps = (
+        ("mentions", lambda t: resolve_mentions(t, guild, mentions, bot_user)),
+        ("repetition", collapse_repetition),
+        ("truncation", lambda t: truncate_to_budget(t, budget)),
+    )
+    savings = {}
+    tokens = estimate_tokens(text)
+    for name, step in steps:
+        text = step(text)
+        after = estimate_tokens(text)
+        savings[name] = tokens - after
+        TOTALS[name] = TOTALS.get(name, 0) + savings[name]
+        tokens = after
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("[PROMPT] saved %d tokens %s", sum(savings.values()), savings)
+    return PreparedPrompt(text, savings)
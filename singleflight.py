@@ -0,0 +1,76 @@
+"""
+Single-flight deduplication for upstream LLM calls.
+
+Concurrent callers asking the same model the same (normalized) prompt share one
+upstream call instead of each starting their own. This covers the window before
+any cached result exists, e.g. a popular message quoted by many users at once.
+"""
+import asyncio
+import hashlib
+import inspect
+
+from prompt_prep import normalize
+
+
+def make_key(model_name: str, prompt: str) -> str:
+    normalized = normalize(prompt)
+    return hashlib.sha1(f"{model_name}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    - do(key, fn, *args) runs fn once per key while a call is in flight; other callers await the same result.
+    - Sync callables run in a worker thread so blocking SDK calls stay off the event loop.
+    - Cancelling one waiter never cancels the shared call; it is cancelled only when every waiter has gone.
+    """
+
+    def __init__(self):
+        self._calls: dict = {}
+        self.upstream_calls = 0
+        self.deduplicated = 0
+
+    async def do(self, key: str, fn, *args):
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(self._run(fn, *args)))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _t, key=key, call=call: self._forget(key, call))
+            self.upstream_calls += 1
+        else:
+            self.deduplicated += 1
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                # Forget first so a caller arriving now starts a fresh call instead of joining this one
+                self._forget(key, call)
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    @staticmethod
+    async def _run(fn, *args):
+        if inspect.iscoroutinefunction(fn):
+            return await fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        return {
+            "upstream_calls": self.upstream_calls,
+            "deduplicated": self.deduplicated,
+            "in_flight": len(self._calls),
+        }
@@ -0,0 +1,92 @@
+"""
+Optional-subsystem loader.
+
+Each subsystem is switched on/off with an env flag (TARA_ENABLE_<NAME>=1/0) and its
+module is only imported when enabled, so text-only deployments never pay for Flask,
+voice or TTS SDK imports. Every import that goes through here is timed; set
+TARA_IMPORT_REPORT=1 to log a startup report (use `python -X importtime main.py`
+for the full per-module tree).
+"""
+from typing import Optional
+import os
+import sys
+import time
+import logging
+import importlib
+
+log = logging.getLogger(__name__)
+
+_STARTED_AT = time.perf_counter()
+_MODULES_AT_START = len(sys.modules)
+
+# name -> (module, enabled by default)
+SUBSYSTEMS = {
+    "dashboard": ("tara_flask_server", True),
+    "voice": ("talk_commands", False),
+    "images": ("image_generation", False),
+}
+
+IMPORT_TIMES: dict = {}
+
+
+def _flag(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None or not raw.strip():
+        return default
+    return raw.strip().lower() in ("1", "true", "yes", "on")
+
+
+def is_enabled(name: str) -> bool:
+    return _flag(f"TARA_ENABLE_{name.upper()}", SUBSYSTEMS[name][1])
+
+
+def timed_import(module: str):
+    """importlib.import_module that records how long a cold import took."""
+    mod = sys.modules.get(module)
+    if mod is not None:
+        return mod
+    start = time.perf_counter()
+    mod = importlib.import_module(module)
+    IMPORT_TIMES[module] = time.perf_counter() - start
+    return mod
+
+
+def load(name: str):
+    """Import the subsystem's module if it is enabled. Returns None when disabled or broken."""
+    if not is_enabled(name):
+        log.info("[BOT] Subsystem '%s' disabled", name)
+        return None
+    try:
+        return timed_import(SUBSYSTEMS[name][0])
+    except Exception as e:
+        log.warning("[BOT] Subsystem '%s' failed to import: %s", name, e)
+        return None
+
+
+def rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB (None where unsupported, e.g. Windows)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def startup_report() -> str:
+    lines = ["[BOT] Startup report"]
+    for module, seconds in sorted(IMPORT_TIMES.items(), key=lambda kv: kv[1], reverse=True):
+        lines.append(f"  import {module:<24} {seconds * 1000:8.1f} ms")
+    lines.append("  subsystems: " + ", ".join(f"{n}={'on' if is_enabled(n) else 'off'}" for n in SUBSYSTEMS))
+    lines.append(f"  modules loaded: {len(sys.modules)} (+{len(sys.modules) - _MODULES_AT_START})")
+    lines.append(f"  elapsed: {(time.perf_counter() - _STARTED_AT) * 1000:.1f} ms")
+    rss = rss_mb()
+    if rss is not None:
+        lines.append(f"  peak RSS: {rss:.1f} MB")
+    return "\n".join(lines)
+
+
+def log_startup_report() -> None:
+    if _flag("TARA_IMPORT_REPORT", False):
+        log.info(startup_report())
@@ -2,17 +2,23 @@ from typing import Optional
 import os
 import json
 import asyncio
-import tempfile
+import logging
 from datetime import datetime, timedelta
 
 import discord
 from discord.ext import commands
 from discord import app_commands, FFmpegPCMAudio
 
-try:
-    from gtts import gTTS  # fallback if ElevenLabs not configured
-except Exception:  # pragma: no cover
-    gTTS = None
+from tts_service import TTSService, normalize_language, SUPPORTED_LANGUAGES
+from singleflight import SingleFlight, make_key
+from command_core import CommandRequest
+from task_supervisor import get_supervisor
+from outbound import get_outbound
+from tara_logging import bind, unbind
+from tracing import trace, span
+from prompt_prep import PreparedPrompt, prepare_prompt
+
+log = logging.getLogger(__name__)
 
 
 # ===== Utilities =====
@@ -24,40 +30,6 @@ def _now() -> datetime:
     return datetime.utcnow()
 
 
-async def _generate_tts_audio(text: str) -> str:
-    """
-    Returns a path to an audio file (mp3) that contains the spoken text using Hume AI TTS.
-    Only supports Hindi and English.
-    """
-    from hume import HumeClient
-    from hume.tts import PostedUtterance, PostedUtteranceVoiceWithName
-    import base64
-    language = os.getenv("TTS_LANGUAGE", "english").lower()
-    voices = {
-        "english": PostedUtteranceVoiceWithName(name="Female English Actor", provider="HUME_AI"),
-        "hindi": PostedUtteranceVoiceWithName(name="Female Hindi Actor", provider="HUME_AI"),
-    }
-    if language not in voices:
-        raise RuntimeError("Supported languages: english, hindi. Set TTS_LANGUAGE env variable.")
-    voice = voices[language]
-    client = HumeClient(api_key=os.getenv("HUME_API_KEY"))
-    response = client.tts.synthesize_json_streaming(
-        utterances=[
-            PostedUtterance(
-                text=text,
-                voice=voice
-            )
-        ]
-    )
-    audio_bytes = b""
-    for chunk in response:
-        audio_bytes += base64.b64decode(chunk["audio"])
-    fd, path = tempfile.mkstemp(suffix=".mp3")
-    with os.fdopen(fd, "wb") as f:
-        f.write(audio_bytes)
-    return path
-
-
 # REMOVE the TalkCommands cog and setup function
 class TalkCommands(commands.Cog):
     """
@@ -68,7 +40,18 @@ class TalkCommands(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.lock_file = _data_path("talk_lock.json")
-        print("[BOT] Talk_Commands Ready!", flush=True)
+        self.tts = TTSService()
+        self.llm_flight = getattr(bot, "llm_flight", None) or SingleFlight()
+        self.supervisor = get_supervisor(bot)
+        self.outbound = get_outbound(bot)
+        self._jobs: list = []
+        # Whoever holds the lock, and where to tell them it was released
+        self._lock_req: Optional[CommandRequest] = None
+        # Daily quota lives in memory and is flushed periodically
+        self.usage_file = _data_path("vc_usage.json")
+        self._usage = self._load_usage()
+        self._usage_dirty = False
+        log.info("[BOT] Talk_Commands Ready!")
 
     # ---------- Lock helpers ----------
     def _read_lock(self) -> dict:
@@ -94,90 +77,151 @@ class TalkCommands(commands.Cog):
             return {}
         return lock
 
-    # ---------- Prefix command ----------
-    async def talk_command(self, ctx: commands.Context, language: str = None, *, message: Optional[str] = None):
+    def _release_lock(self) -> None:
+        self._lock_req = None
+        try:
+            os.remove(self.lock_file)
+        except Exception:
+            pass
+
+    # ---------- Quota helpers ----------
+    def _load_usage(self) -> dict:
+        try:
+            with open(self.usage_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _write_usage(self, data: dict) -> None:
+        with open(self.usage_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+    async def _flush_usage(self) -> None:
+        if not self._usage_dirty:
+            return
+        self._usage_dirty = False
+        await asyncio.to_thread(self._write_usage, dict(self._usage))
+
+    # ---------- Periodic jobs / voice events ----------
+    async def cog_load(self):
+        self._jobs = [
+            self.supervisor.every(30, self._flush_usage, name="talk.flush_usage"),
+            self.supervisor.every(30, self._expire_idle, name="talk.expire_idle"),
+        ]
+
+    async def cog_unload(self):
+        for job in self._jobs:
+            self.supervisor.cancel(job)
+        await self._flush_usage()
+
+    async def _expire_idle(self) -> None:
+        """Release an expired lock and disconnect voice clients that have nothing left to say."""
+        lock = self._read_lock()
+        if lock and self._clear_if_expired(lock):
+            return
+        if lock:
+            self._release_lock()
+        for vc in list(self.bot.voice_clients):
+            if not vc.is_playing():
+                await vc.disconnect()
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
+        req = self._lock_req
+        if req is None or member.id != req.author.id or before.channel == after.channel:
+            return
+        log.debug("[TALK] lock holder %s moved %s -> %s", member.id, before.channel, after.channel)
+        vc = member.guild.voice_client
+        if vc and after.channel == vc.channel:
+            return
+        # Lock holder left (or moved away from) the bot's VC
+        self._release_lock()
+        if vc and vc.is_connected():
+            await vc.disconnect()
+        # /talk holders are notified via the interaction webhook, whose token may have expired
+        try:
+            await req.send(f"{member.display_name} left the VC. Lock released. Next person can use the bot.")
+        except discord.HTTPException as e:
+            log.debug("[TALK] could not send lock-release notice: %s", e)
+
+    def _delete_when_sent(self, sent: asyncio.Future) -> None:
+        if sent.cancelled() or sent.exception() is not None or sent.result() is None:
+            return
+        self.outbound.delete(sent.result())
+
+    # ---------- Talk (shared by prefix, slash and chat routing) ----------
+    async def talk(self, req: CommandRequest, language: Optional[str], message: Optional[str],
+                   prepared: Optional[PreparedPrompt] = None):
         """Join the caller's VC (if any) and speak the Shape API response via TTS. Usage: s_talk <language> <message> (language optional, defaults to hindi)"""
         if not message or not message.strip():
-            await ctx.send("❌ Please provide a message to speak. Usage: `s_talk <message>` or `s_talk <language> <message>` (language: english or hindi, be in a voice channel).")
+            await req.send("❌ Please provide a message to speak. Usage: `s_talk <message>` or `s_talk <language> <message>` (language: english or hindi, be in a voice channel).")
             return
         # If language is not provided, default to hindi
-        if language is None or language.lower() not in ["english", "hindi"]:
-            language = "hindi"
-        else:
-            language = language.lower()
-        os.environ["TTS_LANGUAGE"] = language
+        language = normalize_language(language)
 
         # Usage tracking
-        usage_path = os.path.join(os.path.dirname(__file__), "vc_usage.json")
-        user_id = str(ctx.author.id)
+        user_id = str(req.author.id)
         today = _now().strftime("%Y-%m-%d")
-        try:
-            with open(usage_path, "r", encoding="utf-8") as f:
-                usage = json.load(f)
-        except Exception:
-            usage = {}
-        user_usage = usage.get(user_id, {"date": today, "count": 0})
+        user_usage = self._usage.get(user_id, {"date": today, "count": 0})
         if user_usage["date"] != today:
             user_usage = {"date": today, "count": 0}
         if user_usage["count"] >= 5:
-            await ctx.send("Your daily Talk with Bot is Over. See ya next day!")
-            if ctx.voice_client and ctx.voice_client.is_connected():
-                await ctx.voice_client.disconnect()
-            try:
-                os.remove(self.lock_file)
-            except Exception:
-                pass
-            await ctx.send(f"{ctx.author.display_name} reached daily limit. Lock released. Next person can use the bot.")
+            await req.send("Your daily Talk with Bot is Over. See ya next day!")
+            if req.voice_client and req.voice_client.is_connected():
+                await req.voice_client.disconnect()
+            self._release_lock()
+            await req.send(f"{req.author.display_name} reached daily limit. Lock released. Next person can use the bot.")
             return
         user_usage["count"] += 1
-        usage[user_id] = user_usage
-        with open(usage_path, "w", encoding="utf-8") as f:
-            json.dump(usage, f, indent=2)
+        self._usage[user_id] = user_usage
+        self._usage_dirty = True
 
         # Check voice channel and permissions
-        print(f"[DEBUG] Author: {ctx.author} | Voice: {getattr(ctx.author, 'voice', None)}")
-        if not ctx.author.voice or not ctx.author.voice.channel:
-            print("[DEBUG] User not in a voice channel.")
-            await ctx.send("❌ You need to be **in a voice channel** first.")
+        log.debug("[TALK] Author: %s | Voice: %s", req.author, getattr(req.author, "voice", None))
+        if not req.author.voice or not req.author.voice.channel:
+            log.debug("[TALK] User not in a voice channel.")
+            await req.send("❌ You need to be **in a voice channel** first.")
             return
-        channel: discord.VoiceChannel = ctx.author.voice.channel
-        print(f"[DEBUG] Target channel: {channel}")
+        channel: discord.VoiceChannel = req.author.voice.channel
+        log.debug("[TALK] Target channel: %s", channel)
         # Check bot permissions
-        bot_member = ctx.guild.me
+        bot_member = req.guild.me
         permissions = channel.permissions_for(bot_member)
-        print(f"[DEBUG] Bot permissions: connect={permissions.connect}, speak={permissions.speak}")
+        log.debug("[TALK] Bot permissions: connect=%s, speak=%s", permissions.connect, permissions.speak)
         if not permissions.connect or not permissions.speak:
-            print("[DEBUG] Bot missing permissions.")
-            await ctx.send("❌ I don't have permission to join or speak in your voice channel.")
+            log.debug("[TALK] Bot missing permissions.")
+            await req.send("❌ I don't have permission to join or speak in your voice channel.")
             return
-        print("[DEBUG] Passed voice and permission checks.")
+        log.debug("[TALK] Passed voice and permission checks.")
 
         # Locking
         lock = self._read_lock()
         lock = self._clear_if_expired(lock)
         locked_user = lock.get("user_id")
 
-        if locked_user and int(locked_user) != ctx.author.id:
+        if locked_user and int(locked_user) != req.author.id:
             # Someone else holds the lock
-            member = ctx.guild.get_member(int(locked_user))
+            member = req.guild.get_member(int(locked_user))
             holder = member.display_name if member else f"<@{locked_user}>"
-            await ctx.send(f"{holder} is currently using voice. Try again later.")
+            await req.send(f"{holder} is currently using voice. Try again later.")
             return
 
         # At this point caller owns (or acquires) the lock
-        lock = {"user_id": str(ctx.author.id), "timestamp": _now().isoformat()}
+        lock = {"user_id": str(req.author.id), "timestamp": _now().isoformat()}
         self._write_lock(lock)
+        self._lock_req = req
 
         # Connect/move
-        if ctx.voice_client:
-            if ctx.voice_client.channel != channel:
-                await ctx.voice_client.move_to(channel)
-        else:
-            await channel.connect()
+        with span("voice_connect"):
+            if req.voice_client:
+                if req.voice_client.channel != channel:
+                    await req.voice_client.move_to(channel)
+            else:
+                await channel.connect()
 
         # If user complains about the voice, respond and exit
         if "off" in message.lower() or "bad" in message.lower() or "boring" in message.lower():
-            await ctx.send("Arre bhai, bot ki awaaz thodi off hai aaj! Chalo baad mein baat karte hain, mast mood mein aake.")
+            await req.send("Arre bhai, bot ki awaaz thodi off hai aaj! Chalo baad mein baat karte hain, mast mood mein aake.")
             return
         # Get response from Shape API
         try:
@@ -185,24 +229,35 @@ class TalkCommands(commands.Cog):
             model_name = getattr(self.bot, "shape_model_name", "shape-medium")
             if not shape_client:
                 raise RuntimeError("Shape API client not available.")
-            response_text = shape_client.chat(model_name, message)
+            # Callers that already prepared the message (chat routing) pass it in
+            if prepared is None:
+                with span("prompt_prep") as s:
+                    prepared = prepare_prompt(message, req.guild, bot_user=self.bot.user)
+                    if s is not None:
+                        s.attrs.update(prepared.span_attrs())
+            prompt = prepared.text or message
+            with span("llm", model=model_name):
+                response_text = await self.llm_flight.do(make_key(model_name, prompt), shape_client.chat, model_name, prompt)
         except Exception as e:
-            await ctx.send(f"Shape API error: `{e}`")
+            await req.send(f"Shape API error: `{e}`")
             return
 
         # Generate audio and play
         try:
-            audio_path = await _generate_tts_audio(response_text)
+            with span("tts", language=language):
+                audio_path = await self.tts.synthesize(response_text, language=language)
         except Exception as e:
-            await ctx.send(f"TTS error: `{e}`")
+            await req.send(f"TTS error: `{e}`")
             return
 
-        source = FFmpegPCMAudio(audio_path)
-        vc = ctx.voice_client
+        with span("ffmpeg_spawn"):
+            source = FFmpegPCMAudio(audio_path)
+        vc = req.voice_client
         if not vc:
-            await ctx.send("Not connected to a voice channel.")
+            await req.send("Not connected to a voice channel.")
             return
 
+        loop = asyncio.get_running_loop()
         done = asyncio.Event()
 
         def _after_play(err: Exception | None):
@@ -210,57 +265,50 @@ class TalkCommands(commands.Cog):
                 os.remove(audio_path)
             except Exception:
                 pass
-            done.set()
+            # Called from the audio player thread
+            loop.call_soon_threadsafe(done.set)
 
-        # Only send 'Speaking…' message
-        speaking_msg = await ctx.send("Speaking…")
+        # 'Speaking…' and the unmute are independent; only the unmute has to land before playback
+        speaking = self.outbound.submit(("channel", req.channel.id), req.send, "Speaking…")
 
         # Unmute before speaking
-        if vc and hasattr(vc, "guild") and hasattr(vc, "mute"):
-            try:
-                await ctx.author.guild.me.edit(mute=False)
-            except Exception:
-                pass
-
-        vc.play(source, after=_after_play)
+        if vc.is_connected() and req.guild.me is not None:
+            with span("unmute"):
+                try:
+                    await self.outbound.set_mute(req.guild.me, False)
+                except Exception:
+                    pass
 
         # Wait until finished
-        while vc.is_playing():
-            await asyncio.sleep(0.2)
-        await done.wait()
+        with span("playback"):
+            vc.play(source, after=_after_play)
+            await done.wait()
 
-        # Mute after speaking
-        if vc and hasattr(vc, "guild") and hasattr(vc, "mute"):
-            try:
-                await ctx.author.guild.me.edit(mute=True)
-            except Exception:
-                pass
-
-        # Delete 'Speaking…' message
-        if speaking_msg:
-            try:
-                await speaking_msg.delete()
-            except Exception:
-                pass
+        # Mute after speaking and delete 'Speaking…' off the critical path.
+        # A mute still queued when the next utterance unmutes is dropped by the queue.
+        if vc.is_connected() and req.guild.me is not None:
+            self.outbound.set_mute(req.guild.me, True)
+        speaking.add_done_callback(self._delete_when_sent)
 
         # Update lock timestamp (keeps ownership alive)
         lock["timestamp"] = _now().isoformat()
         self._write_lock(lock)
+        # Leaving the VC is handled by on_voice_state_update, idle expiry by the _expire_idle job
 
-        # Listen for user leaving VC or AFK timeout
-        async def check_user_left_or_afk():
-            await asyncio.sleep(1)
-            member = ctx.guild.get_member(ctx.author.id)
-            if not member or not member.voice or member.voice.channel != channel:
-                # User left VC
-                try:
-                    os.remove(self.lock_file)
-                except Exception:
-                    pass
-                await ctx.send(f"{ctx.author.display_name} left the VC. Lock released. Next person can use the bot.")
-                if vc and vc.is_connected():
-                    await vc.disconnect()
-        asyncio.create_task(check_user_left_or_afk())
+    # ---------- Prefix command ----------
+    @commands.command(name="s_talk", aliases=["talk"])
+    async def talk_command(self, ctx: commands.Context, language: Optional[str] = None, *, message: Optional[str] = None):
+        # A first word that isn't a language is part of the message
+        if language and language.lower() not in SUPPORTED_LANGUAGES:
+            message = f"{language} {message}" if message else language
+            language = None
+        req = CommandRequest.from_context(ctx)
+        token = bind(**req.log_fields())
+        try:
+            with trace("talk", entry="prefix"):
+                await self.talk(req, language, message)
+        finally:
+            unbind(token)
 
     # ---------- Status ----------
     @commands.command(name="s_talkstatus")
@@ -279,28 +327,22 @@ class TalkCommands(commands.Cog):
 
     # ---------- Slash version ----------
     @app_commands.command(name="talk", description="Talk in your voice channel via TTS.")
-    @app_commands.describe(message="What should I say?")
-    async def slash_talk(self, interaction: discord.Interaction, message: str):
-        await interaction.response.defer(ephemeral=True, thinking=True)
-        # create a lightweight context shim to reuse prefix logic
-        class _ShimCtx:
-            def __init__(self, bot, interaction):
-                self.bot = bot
-                self.guild = interaction.guild
-                self.author = interaction.user
-                self.voice_client = interaction.guild.voice_client if interaction.guild else None
-                self.channel = interaction.channel
-
-            async def send(self, content):
-                await interaction.followup.send(content, ephemeral=True)
-
-        ctx = _ShimCtx(self.bot, interaction)
-        await self.talk_command.callback(self, ctx, message=message)  # call underlying impl
+    @app_commands.describe(message="What should I say?", language="Voice language (default hindi)")
+    @app_commands.choices(language=[app_commands.Choice(name=lang, value=lang) for lang in SUPPORTED_LANGUAGES])
+    async def slash_talk(self, interaction: discord.Interaction, message: str, language: Optional[app_commands.Choice[str]] = None):
+        req = CommandRequest.from_interaction(interaction)
+        token = bind(**req.log_fields())
+        try:
+            with trace("talk", entry="slash"):
+                await req.defer()
+                await self.talk(req, language.value if language else None, message)
+        finally:
+            unbind(token)
 
     # ---------- Ready ----------
     @commands.Cog.listener()
     async def on_ready(self):
-        print("[BOT] TalkCommands ready.", flush=True)
+        log.info("[BOT] TalkCommands ready.")
 
     def _get_prefix(self, guild: Optional[discord.Guild]) -> str:
         default_prefix = "!s_"
@@ -316,4 +358,6 @@ class TalkCommands(commands.Cog):
 
 
 async def setup(bot: commands.Bot):
-    await bot.add_cog(TalkCommands(bot))
+    cog = TalkCommands(bot)
+    await asyncio.to_thread(cog.tts.warm)
+    await bot.add_cog(cog)
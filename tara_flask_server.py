@@ -1,4 +1,9 @@
-from flask import Flask, render_template_string, jsonify
+import os
+import hmac
+
+from flask import Flask, render_template_string, jsonify, request, abort
+
+import tracing
 
 app = Flask(__name__)
 
@@ -182,5 +187,18 @@ def home():
 def healthz():
     return jsonify(ok=True)
 
+@app.get("/traces")
+def traces():
+    # Traces carry message IDs and upstream errors: off unless TARA_TRACE_TOKEN is set, and then token-only
+    token = os.getenv("TARA_TRACE_TOKEN")
+    if not token:
+        abort(404)
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(supplied.encode(), token.encode()):
+        abort(401)
+    # Same process as the bot, so this reads the live ring buffer
+    limit = request.args.get("limit", 20, type=int)
+    return jsonify(slowest=tracing.slowest(limit), stages=tracing.stage_percentiles())
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,138 @@
+"""
+Logging setup: records are handed to a QueueHandler on the calling thread and
+written by a QueueListener thread, so stdout I/O never runs on the event loop.
+
+- LOG_LEVEL (default INFO) gates records before any message formatting happens;
+  use %-style args (log.debug("x=%s", x)), not f-strings.
+- LOG_FORMAT=json (default) emits one JSON object per line with guild/user/request
+  IDs taken from bind(); LOG_FORMAT=text keeps the classic one-line format.
+- Pass extra={"sample_every": N} on high-frequency records to keep 1 in N.
+"""
+from typing import Optional
+import os
+import sys
+import copy
+import json
+import queue
+import atexit
+import logging
+import logging.handlers
+from contextvars import ContextVar, Token
+
+
+CONTEXT_FIELDS = ("guild_id", "user_id", "request_id")
+
+_context: ContextVar[dict] = ContextVar("tara_log_context", default={})
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+# ===== Context =====
+def bind(**fields) -> Token:
+    """Attach fields (guild_id, user_id, request_id, ...) to every record logged from this task."""
+    return _context.set({**_context.get(), **fields})
+
+
+def unbind(token: Token) -> None:
+    _context.reset(token)
+
+
+def current_context() -> dict:
+    return _context.get()
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps 1 in `sample_every` records per (logger, message template); others pass untouched."""
+
+    def __init__(self):
+        super().__init__()
+        self._counts: dict = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        every = getattr(record, "sample_every", None)
+        if not every or every <= 1:
+            return True
+        key = (record.name, record.msg)
+        n = self._counts.get(key, 0)
+        self._counts[key] = n + 1
+        return n % every == 0
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    The stdlib prepare() runs the full formatter on the calling thread and folds the
+    traceback into msg. Only merge args and render the traceback here; the listener's
+    formatter does the rest (and can emit the traceback as its own field).
+    """
+
+    _exc_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exc_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# ===== Formatting =====
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in CONTEXT_FIELDS:
+            value = getattr(record, key, None)
+            if value is not None:
+                data[key] = value
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None) -> None:
+    """Route the root logger through a queue; safe to call more than once."""
+    global _listener
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "json")).lower()
+
+    stream = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        stream.setFormatter(JsonFormatter())
+    else:
+        stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _QueueHandler(q)
+    handler.addFilter(SamplingFilter())
+    handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    if _listener is not None:
+        _listener.stop()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(q, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
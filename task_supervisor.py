@@ -0,0 +1,136 @@
+"""
+Background task supervision.
+
+Every background coroutine goes through TaskSupervisor.spawn() so it is strongly
+referenced until it finishes and its exceptions are logged instead of lost.
+Periodic jobs (lock expiry, quota flushing, cache eviction, idle voice
+disconnects) are registered with every() and driven by one shared scheduler task.
+"""
+from typing import Optional
+import asyncio
+import inspect
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class _Job:
+    __slots__ = ("name", "interval", "fn", "next_run", "running")
+
+    def __init__(self, name: str, interval: float, fn, next_run: float):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self.next_run = next_run
+        self.running = False
+
+
+class TaskSupervisor:
+    """
+    - spawn(coro) tracks a task for its whole lifetime.
+    - every(seconds, fn) runs fn (sync or async) periodically; a slow run is never overlapped by the next.
+    - shutdown() stops the scheduler, gives live tasks `timeout` seconds to finish, then cancels them.
+    """
+
+    def __init__(self):
+        self._tasks: set = set()
+        self._jobs: list = []
+        self._scheduler: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._closing = False
+
+    # ---------- One-off tasks ----------
+    def spawn(self, coro, name: Optional[str] = None) -> Optional[asyncio.Task]:
+        if self._closing:
+            coro.close()
+            return None
+        task = asyncio.create_task(coro, name=name)
+        self._tasks.add(task)
+        task.add_done_callback(self._on_done)
+        return task
+
+    def _on_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.error("[TASK] %s failed", task.get_name(), exc_info=task.exception())
+
+    # ---------- Periodic jobs ----------
+    def every(self, interval: float, fn, name: Optional[str] = None) -> _Job:
+        loop = asyncio.get_running_loop()
+        job = _Job(name or getattr(fn, "__qualname__", "job"), interval, fn, loop.time() + interval)
+        self._jobs.append(job)
+        self._ensure_scheduler()
+        self._wake.set()
+        return job
+
+    def cancel(self, job: _Job) -> None:
+        if job in self._jobs:
+            self._jobs.remove(job)
+
+    def _ensure_scheduler(self) -> None:
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        if self._scheduler is None or self._scheduler.done():
+            self._scheduler = asyncio.create_task(self._run_scheduler(), name="supervisor.scheduler")
+
+    async def _run_scheduler(self) -> None:
+        loop = asyncio.get_running_loop()
+        # Exit on _closing rather than relying on cancellation: 3.11's wait_for can swallow a cancel
+        while not self._closing:
+            now = loop.time()
+            for job in list(self._jobs):
+                if job.next_run <= now and not job.running:
+                    job.next_run = now + job.interval
+                    job.running = True
+                    self.spawn(self._run_job(job), name=job.name)
+            next_run = min((job.next_run for job in self._jobs), default=now + 3600)
+            self._wake.clear()
+            try:
+                async with asyncio.timeout(max(0.0, next_run - loop.time())):
+                    await self._wake.wait()
+            except TimeoutError:
+                pass
+
+    @staticmethod
+    async def _run_job(job: _Job) -> None:
+        try:
+            result = job.fn()
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            log.exception("[TASK] periodic job %s failed", job.name)
+        finally:
+            job.running = False
+
+    # ---------- Introspection / shutdown ----------
+    @property
+    def live_tasks(self) -> int:
+        return len(self._tasks)
+
+    def stats(self) -> dict:
+        return {
+            "live_tasks": len(self._tasks),
+            "periodic_jobs": [job.name for job in self._jobs],
+        }
+
+    async def shutdown(self, timeout: float = 5.0) -> None:
+        self._closing = True
+        self._jobs.clear()
+        if self._wake is not None:
+            self._wake.set()
+        if self._scheduler is not None:
+            self._scheduler.cancel()
+            await asyncio.gather(self._scheduler, return_exceptions=True)
+        if self._tasks:
+            _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def get_supervisor(bot) -> TaskSupervisor:
+    """The bot-wide supervisor, created on first use if main didn't attach one."""
+    supervisor = getattr(bot, "supervisor", None)
+    if supervisor is None:
+        supervisor = bot.supervisor = TaskSupervisor()
+    return supervisor
@@ -0,0 +1,212 @@
+"""
+Lightweight in-process request tracing.
+
+trace() opens a trace for one request (or, inside an existing trace, just a
+span); span() times one stage of it. The current trace/span live in context
+vars, so they follow the request through awaits and asyncio.to_thread. Finished
+traces go into a ring buffer (TARA_TRACE_BUFFER, default 500) that the dashboard
+reads, and optionally to an OTLP/JSON lines file (TARA_TRACE_FILE) for offline use.
+"""
+from typing import Optional
+import os
+import json
+import math
+import time
+import queue
+import logging
+import secrets
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from tara_logging import current_context
+
+log = logging.getLogger(__name__)
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start", "end", "attrs")
+
+    def __init__(self, name: str, parent_id: Optional[str], attrs: dict):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.attrs = attrs
+
+
+class Trace:
+    __slots__ = ("name", "trace_id", "request_id", "wall_start_ns", "start", "spans")
+
+    def __init__(self, name: str, request_id):
+        self.name = name
+        self.trace_id = secrets.token_hex(16)
+        self.request_id = request_id
+        self.wall_start_ns = time.time_ns()
+        self.start = time.perf_counter()
+        self.spans: list = []
+
+    def to_dict(self) -> dict:
+        root = self.spans[-1] if self.spans else None
+        return {
+            "trace_id": self.trace_id,
+            "request_id": self.request_id,
+            "name": self.name,
+            "start": datetime.fromtimestamp(self.wall_start_ns / 1e9, timezone.utc).isoformat(),
+            "duration_ms": round((root.end - root.start) * 1000, 2) if root else 0.0,
+            "spans": [
+                {
+                    "name": s.name,
+                    "offset_ms": round((s.start - self.start) * 1000, 2),
+                    "duration_ms": round((s.end - s.start) * 1000, 2),
+                    **({"attrs": s.attrs} if s.attrs else {}),
+                }
+                for s in sorted(self.spans, key=lambda s: s.start)
+            ],
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("tara_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("tara_span", default=None)
+
+_buffer: deque = deque(maxlen=int(os.getenv("TARA_TRACE_BUFFER", "500")))
+_buffer_lock = threading.Lock()
+
+
+# ===== Recording =====
+@contextmanager
+def span(name: str, **attrs):
+    """Time one stage of the current trace; a no-op outside a trace."""
+    t = _current_trace.get()
+    if t is None:
+        yield None
+        return
+    parent = _current_span.get()
+    s = Span(name, parent.span_id if parent else None, attrs)
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.attrs["error"] = repr(e)
+        raise
+    finally:
+        s.end = time.perf_counter()
+        _current_span.reset(token)
+        t.spans.append(s)
+
+
+@contextmanager
+def trace(name: str, request_id=None, **attrs):
+    """Start a trace for one request. Nested calls become spans of the enclosing trace."""
+    if _current_trace.get() is not None:
+        with span(name, **attrs) as s:
+            yield s
+        return
+    if request_id is None:
+        request_id = current_context().get("request_id")
+    t = Trace(name, request_id)
+    token = _current_trace.set(t)
+    try:
+        with span(name, **attrs) as s:
+            yield s
+    finally:
+        _current_trace.reset(token)
+        _finish(t)
+
+
+def _finish(t: Trace) -> None:
+    with _buffer_lock:
+        _buffer.append(t)
+    if _exporter is not None:
+        _exporter.export(t)
+
+
+# ===== Queries (used by the dashboard) =====
+def recent() -> list:
+    with _buffer_lock:
+        return list(_buffer)
+
+
+def slowest(limit: int = 20) -> list:
+    traces = sorted(recent(), key=lambda t: t.spans[-1].end - t.spans[-1].start if t.spans else 0, reverse=True)
+    return [t.to_dict() for t in traces[:limit]]
+
+
+def _percentile(sorted_values: list, p: float) -> float:
+    # nearest-rank
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def stage_percentiles() -> dict:
+    durations: dict = {}
+    for t in recent():
+        for s in t.spans:
+            durations.setdefault(s.name, []).append((s.end - s.start) * 1000)
+    stats = {}
+    for name, values in durations.items():
+        values.sort()
+        stats[name] = {
+            "count": len(values),
+            "p50_ms": round(_percentile(values, 50), 2),
+            "p90_ms": round(_percentile(values, 90), 2),
+            "p99_ms": round(_percentile(values, 99), 2),
+            "max_ms": round(values[-1], 2),
+        }
+    return stats
+
+
+# ===== OTLP file exporter =====
+class OTLPFileExporter:
+    """
+    Appends one OTLP/JSON `ExportTraceServiceRequest` per trace to a file (JSON lines),
+    which collectors and viewers can ingest later. Writes happen on a background thread.
+    """
+
+    def __init__(self, path: str, service_name: str = "tara-bot"):
+        self.path = path
+        self.service_name = service_name
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, t: Trace) -> None:
+        self._queue.put(t)
+
+    def _to_otlp(self, t: Trace) -> dict:
+        def ns(perf: float) -> str:
+            return str(t.wall_start_ns + int((perf - t.start) * 1e9))
+
+        spans = []
+        for s in t.spans:
+            attributes = [{"key": k, "value": {"stringValue": str(v)}} for k, v in s.attrs.items()]
+            if s.parent_id is None and t.request_id is not None:
+                attributes.append({"key": "request_id", "value": {"stringValue": str(t.request_id)}})
+            spans.append({
+                "traceId": t.trace_id,
+                "spanId": s.span_id,
+                **({"parentSpanId": s.parent_id} if s.parent_id else {}),
+                "name": s.name,
+                "kind": 1,
+                "startTimeUnixNano": ns(s.start),
+                "endTimeUnixNano": ns(s.end),
+                "attributes": attributes,
+            })
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "tara.tracing"}, "spans": spans}],
+        }]}
+
+    def _run(self) -> None:
+        while True:
+            t = self._queue.get()
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(self._to_otlp(t)) + "\n")
+            except Exception as e:
+                log.warning("[TRACE] export to %s failed: %s", self.path, e)
+
+
+_exporter: Optional[OTLPFileExporter] = OTLPFileExporter(os.environ["TARA_TRACE_FILE"]) if os.getenv("TARA_TRACE_FILE") else None
@@ -0,0 +1,183 @@
+from typing import Optional
+import os
+import io
+import base64
+import asyncio
+import logging
+import tempfile
+import threading
+import importlib.util
+
+from tracing import span
+
+log = logging.getLogger(__name__)
+
+
+# ===== Languages / voices =====
+DEFAULT_LANGUAGE = "hindi"
+
+HUME_VOICES = {
+    "english": "Female English Actor",
+    "hindi": "Female Hindi Actor",
+}
+
+GTTS_LANGS = {
+    "english": "en",
+    "hindi": "hi",
+}
+
+SUPPORTED_LANGUAGES = tuple(HUME_VOICES)
+
+
+class TTSError(RuntimeError):
+    """Raised when no provider could synthesize the requested text."""
+
+
+def normalize_language(language: Optional[str]) -> str:
+    """Map user input to a supported language, falling back to the default."""
+    if not language:
+        return DEFAULT_LANGUAGE
+    language = language.lower()
+    return language if language in SUPPORTED_LANGUAGES else DEFAULT_LANGUAGE
+
+
+# ===== Providers =====
+class HumeProvider:
+    """
+    Hume AI TTS. One HumeClient is built on first use and reused for every
+    request (the client is safe to share between executor threads).
+    """
+
+    name = "hume"
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key if api_key is not None else os.getenv("HUME_API_KEY")
+        self._client = None
+        self._utterance_cls = None
+        self._voice_cls = None
+        self._voices: dict = {}
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    def warm(self) -> None:
+        if self.available:
+            self._ensure_client()
+
+    def _ensure_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from hume import HumeClient
+                    from hume.tts import PostedUtterance, PostedUtteranceVoiceWithName
+                    self._utterance_cls = PostedUtterance
+                    self._voice_cls = PostedUtteranceVoiceWithName
+                    self._client = HumeClient(api_key=self.api_key)
+        return self._client
+
+    def _voice(self, name: str):
+        voice = self._voices.get(name)
+        if voice is None:
+            voice = self._voice_cls(name=name, provider="HUME_AI")
+            self._voices[name] = voice
+        return voice
+
+    def synthesize(self, text: str, language: str, voice: Optional[str] = None) -> bytes:
+        client = self._ensure_client()
+        voice_name = voice or HUME_VOICES[language]
+        response = client.tts.synthesize_json_streaming(
+            utterances=[self._utterance_cls(text=text, voice=self._voice(voice_name))]
+        )
+        buf = bytearray()
+        for chunk in response:
+            buf += base64.b64decode(chunk["audio"])
+        return bytes(buf)
+
+
+class GTTSProvider:
+    """Google Translate TTS via gTTS. No API key needed; voice is ignored."""
+
+    name = "gtts"
+
+    def __init__(self):
+        self._gtts = None
+        self._installed = importlib.util.find_spec("gtts") is not None
+
+    @property
+    def available(self) -> bool:
+        return self._installed
+
+    def warm(self) -> None:
+        if self._gtts is None and self._installed:
+            from gtts import gTTS
+            self._gtts = gTTS
+
+    def synthesize(self, text: str, language: str, voice: Optional[str] = None) -> bytes:
+        self.warm()
+        fp = io.BytesIO()
+        self._gtts(text=text, lang=GTTS_LANGS.get(language, "en")).write_to_fp(fp)
+        return fp.getvalue()
+
+
+def _write_temp_mp3(audio: bytes) -> str:
+    fd, path = tempfile.mkstemp(suffix=".mp3")
+    with os.fdopen(fd, "wb") as f:
+        f.write(audio)
+    return path
+
+
+PROVIDERS = {
+    "hume": HumeProvider,
+    "gtts": GTTSProvider,
+}
+
+
+def default_providers() -> list:
+    """Providers named in TARA_TTS_PROVIDERS (comma separated, in fallback order)."""
+    names = os.getenv("TARA_TTS_PROVIDERS", "hume,gtts")
+    return [PROVIDERS[n.strip()]() for n in names.split(",") if n.strip() in PROVIDERS]
+
+
+# ===== Service =====
+class TTSService:
+    """
+    Created once per cog and shared by every guild.
+    - Providers are tried in order; the first one that succeeds wins (Hume, then gTTS).
+    - Language/voice are per-request arguments, never process-global state.
+    - Blocking SDK calls run in worker threads, bounded by `max_concurrency`.
+    """
+
+    def __init__(self, providers: Optional[list] = None, max_concurrency: int = 4):
+        self.providers = providers if providers is not None else default_providers()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def warm(self) -> None:
+        """Resolve provider SDK imports and clients up front so the first request doesn't pay for them."""
+        for provider in self.providers:
+            try:
+                provider.warm()
+            except Exception as e:
+                log.warning("[TTS] %s unavailable: %s", provider.name, e)
+
+    async def synthesize(self, text: str, language: Optional[str] = None, voice: Optional[str] = None) -> str:
+        """Returns a path to a temporary mp3 file; the caller is responsible for deleting it."""
+        language = normalize_language(language)
+        errors = []
+        async with self._semaphore:
+            for provider in self.providers:
+                if not provider.available:
+                    continue
+                try:
+                    with span(f"tts.{provider.name}"):
+                        audio = await asyncio.to_thread(provider.synthesize, text, language, voice)
+                except Exception as e:
+                    log.warning("[TTS] %s failed: %s", provider.name, e)
+                    errors.append(f"{provider.name}: {e}")
+                    continue
+                if audio:
+                    with span("tts.write_file", bytes=len(audio)):
+                        return await asyncio.to_thread(_write_temp_mp3, audio)
+                errors.append(f"{provider.name}: empty audio")
+        raise TTSError("; ".join(errors) or "No TTS provider configured (set HUME_API_KEY or install gTTS).")